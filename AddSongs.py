@@ -39,17 +39,25 @@ def add_song_to_database(wav_path, metadata):
     try:
         print(f"🎵 Processing: {metadata['title']} by {metadata['artist']}")
         
-        fingerprint, _ = AudioModule.GenerateConstellationMap(wav_path)
+        fingerprint = AudioModule.GenerateConstellationMap(wav_path)
         if fingerprint.size == 0:
             print("⚠️  Fingerprint generation failed. Skipping.")
             return False
 
-        # The metadata dictionary now includes the filepath
-        song_id = DBModule.AddSong(metadata)
+        # The metadata dictionary now includes the filepath. The constellation
+        # map is stored with the song so the catalogue can be re-hashed later
+        # without decoding the MP3 again (see ReindexSongs.py).
+        song_id = DBModule.AddSong(metadata, fingerprint, AudioModule.PeakResolution(44100))
         
         hashes = DBModule.GenerateHashes(fingerprint)
         
-        DBModule.AddFingerprints(song_id, hashes)
+        try:
+            DBModule.AddFingerprints(song_id, hashes)
+        except Exception:
+            # Don't leave a half-ingested song behind; the MP3 stays in
+            # the Songs folder so the next run retries it.
+            DBModule.DeleteSong(song_id)
+            raise
         
         print(f"✅ Added successfully! (Song ID: {song_id})")
         return True
@@ -1,13 +1,26 @@
-import pyaudio
 import wave
+import time
 import numpy
 import numpy.fft as fft
 from scipy.signal import resample_poly
 import os
+import DBModule
+
+# pyaudio is only needed for live capture; FileSource works without it
+# (and without a sound card).
+try:
+    import pyaudio
+except ImportError:
+    pyaudio = None
 
 # Global stop condition for the recording thread
 stopCondition = False
 
+# Constellation map STFT settings
+DOWNSAMPLE_FACTOR = 4
+WINDOW_SIZE = 1024
+WINDOW_OVERLAP = 512
+
 def StereoToMono(stereoAudio):
     return stereoAudio.mean(axis=1)
 
@@ -42,11 +55,11 @@ def GenerateConstellationMap(filename):
 
     monoAudio = StereoToMono(audioData)
     
-    downsampledAudio = resample_poly(monoAudio, 1, 4)
-    SAMPLERATE_NEW = SAMPLERATE // 4
+    downsampledAudio = resample_poly(monoAudio, 1, DOWNSAMPLE_FACTOR)
+    SAMPLERATE_NEW = SAMPLERATE // DOWNSAMPLE_FACTOR
     
-    windowSize = 1024
-    windowOverlap = 512
+    windowSize = WINDOW_SIZE
+    windowOverlap = WINDOW_OVERLAP
     
     if downsampledAudio.shape[0] < windowSize:
         return numpy.array([])
@@ -77,25 +90,116 @@ def GenerateConstellationMap(filename):
 
     return numpy.array(peaks)
 
-def RecordAudio(recordingDuration, OUTPUT_FILENAME, saveFrequency):
+def PeakResolution(samplerate=44100):
+    """
+    (seconds per frame, Hz per bin) of GenerateConstellationMap's peaks for
+    audio at `samplerate`. Every peak is an exact multiple of these, which
+    lets DBModule store them as integers.
+    """
+    SAMPLERATE_NEW = samplerate // DOWNSAMPLE_FACTOR
+    return (WINDOW_OVERLAP / SAMPLERATE_NEW, SAMPLERATE_NEW / WINDOW_SIZE)
+
+class MicrophoneSource:
+    """Live audio from the default input device via pyaudio."""
+
+    def __init__(self, channels=1, samplerate=44100, chunk=1024):
+        if pyaudio is None:
+            raise RuntimeError("pyaudio is not installed; use FileSource instead")
+        self.channels = channels
+        self.samplerate = samplerate
+        self.py = pyaudio.PyAudio()
+        self.sample_width = self.py.get_sample_size(pyaudio.paInt16)
+        self.stream = self.py.open(channels=channels, rate=samplerate, format=pyaudio.paInt16,
+                                   input=True, frames_per_buffer=chunk)
+
+    def Read(self, chunk):
+        return self.stream.read(chunk, exception_on_overflow=False)
+
+    def Close(self):
+        self.stream.stop_stream()
+        self.stream.close()
+        self.py.terminate()
+
+class FileSource:
+    """
+    Replays a WAV file as if it were the microphone: mono 16-bit audio at
+    `samplerate`, delivered at `speed` times real time (0 = as fast as
+    possible). Read() returns b'' once the file is exhausted.
+    """
+
+    def __init__(self, filename, speed=1.0, samplerate=44100, start=0.0, duration=None):
+        audioData, fileRate = InitialiseAudio(filename)
+        monoAudio = StereoToMono(audioData) if audioData.size else numpy.array([])
+        if fileRate != samplerate and monoAudio.size:
+            monoAudio = resample_poly(monoAudio, samplerate, fileRate)
+        first = int(start * samplerate)
+        last = None if duration is None else first + int(duration * samplerate)
+        self.samples = numpy.clip(monoAudio[first:last], -32768, 32767).astype(numpy.int16)
+
+        self.channels = 1
+        self.samplerate = samplerate
+        self.sample_width = 2
+        self.speed = speed
+        self.position = 0
+        self.startTime = None
+
+    def Read(self, chunk):
+        if self.startTime is None:
+            self.startTime = time.perf_counter()
+        buffer = self.samples[self.position:self.position + chunk]
+        self.position += len(buffer)
+
+        # Don't hand over audio before it would have been "heard".
+        if self.speed > 0:
+            due = self.startTime + self.position / (self.samplerate * self.speed)
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        return buffer.tobytes()
+
+    def Close(self):
+        pass
+
+def IdentifyWhileRecording(recordThread, filepath, secondsPassed, pollInterval=1.0):
+    """
+    The capture-to-recognition loop: re-fingerprints the growing recording and
+    searches until a song matches or `recordThread` finishes. Used by
+    GUIModule.MainApplication.IDSong and, headlessly, by replay_harness.py.
+    Returns the song metadata, or 0 if nothing matched.
+    """
+    songMetaData = 0
+    while recordThread.is_alive() and not songMetaData:
+        # Generate the fingerprint from the entire file so far.
+        # GenerateConstellationMap is resilient to file-read errors.
+        fingerprint = GenerateConstellationMap(filepath)
+        
+        # Only search if we have a valid fingerprint
+        if fingerprint.size > 0:
+            songMetaData = DBModule.SearchDatabase(secondsPassed(), fingerprint)
+
+        # Wait a moment before re-processing the file
+        if not songMetaData:
+            time.sleep(pollInterval)
+    return songMetaData
+
+def RecordAudio(recordingDuration, OUTPUT_FILENAME, saveFrequency, source=None):
     """
     FIX: This function now writes frames to the file periodically,
     preventing the file from being in an unreadable state.
+    Audio comes from `source` (MicrophoneSource by default, or a FileSource
+    to replay a recording through the same path).
     """
     global stopCondition
     stopCondition = False
-    
-    CHANNELS = 1
-    SAMPLERATE = 44100
-    FORMAT = pyaudio.paInt16
+
     CHUNK = 1024
+    if source is None:
+        source = MicrophoneSource(chunk=CHUNK)
+    SAMPLERATE = source.samplerate
 
-    py = pyaudio.PyAudio()
-    stream = py.open(channels=CHANNELS, rate=SAMPLERATE, format=FORMAT, input=True, frames_per_buffer=CHUNK)
-    
     saveFile = wave.open(OUTPUT_FILENAME, 'wb')
-    saveFile.setnchannels(CHANNELS)
-    saveFile.setsampwidth(py.get_sample_size(FORMAT))
+    saveFile.setnchannels(source.channels)
+    saveFile.setsampwidth(source.sample_width)
     saveFile.setframerate(SAMPLERATE)
     
     frames_to_write = []
@@ -107,7 +211,9 @@ def RecordAudio(recordingDuration, OUTPUT_FILENAME, saveFrequency):
             if stopCondition:
                 break
             
-            audioBuffer = stream.read(CHUNK, exception_on_overflow=False)
+            audioBuffer = source.Read(CHUNK)
+            if not audioBuffer:
+                break
             frames_to_write.append(audioBuffer)
             
             if len(frames_to_write) >= chunks_per_save_interval:
@@ -117,7 +223,5 @@ def RecordAudio(recordingDuration, OUTPUT_FILENAME, saveFrequency):
         if frames_to_write:
             saveFile.writeframes(b''.join(frames_to_write))
     finally:
-        stream.stop_stream()
-        stream.close()
-        py.terminate()
+        source.Close()
         saveFile.close()
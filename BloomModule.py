@@ -0,0 +1,101 @@
+import os
+import math
+import numpy
+
+# Default sizing for a new filter. The filter is rebuilt at double the
+# capacity once it holds more items than it was sized for.
+DEFAULT_CAPACITY = 1_000_000
+DEFAULT_FALSE_POSITIVE_RATE = 0.01
+
+_MASK64 = numpy.uint64(0xFFFFFFFFFFFFFFFF)
+
+def _Mix64(values, seed):
+    """splitmix64 finaliser over a uint64 array (wraps on overflow)."""
+    z = values + numpy.uint64(seed)
+    z = (z ^ (z >> numpy.uint64(30))) * numpy.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> numpy.uint64(27))) * numpy.uint64(0x94D049BB133111EB)
+    return (z ^ (z >> numpy.uint64(31))) & _MASK64
+
+def MixHash(value, seed):
+    """Scalar version of _Mix64 for a single Python int."""
+    z = (value + seed) & 0xFFFFFFFFFFFFFFFF
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return z ^ (z >> 31)
+
+class BloomFilter:
+    """
+    Probabilistic set of fingerprint hashes: Contains() never says no for
+    a hash that was added, and says yes for an absent one with roughly
+    EstimatedFalsePositiveRate() probability.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, false_positive_rate=DEFAULT_FALSE_POSITIVE_RATE):
+        self.capacity = max(int(capacity), 1)
+        self.target_rate = false_positive_rate
+        self.num_bits = max(int(-self.capacity * math.log(false_positive_rate) / math.log(2) ** 2), 64)
+        self.num_hashes = max(round(self.num_bits / self.capacity * math.log(2)), 1)
+        self.bits = numpy.zeros((self.num_bits + 7) // 8, dtype=numpy.uint8)
+        self.count = 0
+        # Caller-defined version of the data the filter covers; DBModule uses
+        # it to detect a filter that has fallen behind the database.
+        self.generations = []
+
+    def _BitIndexes(self, hashes):
+        """(len(hashes), num_hashes) bit positions via double hashing."""
+        values = numpy.asarray(hashes, dtype=numpy.int64).astype(numpy.uint64)
+        h1 = _Mix64(values, 0x9E3779B97F4A7C15)
+        h2 = _Mix64(values, 0x632BE59BD9B4E019) | numpy.uint64(1)
+        steps = numpy.arange(self.num_hashes, dtype=numpy.uint64)
+        return (h1[:, None] + steps[None, :] * h2[:, None]) % numpy.uint64(self.num_bits)
+
+    def Add(self, hashes):
+        """Adds hashes; returns how many were not already (apparently) present."""
+        if len(hashes) == 0:
+            return 0
+        hashes = numpy.unique(numpy.asarray(hashes, dtype=numpy.int64))
+        new_items = int((~self.Contains(hashes)).sum())
+        indexes = self._BitIndexes(hashes).ravel()
+        numpy.bitwise_or.at(self.bits, indexes >> numpy.uint64(3),
+                            (numpy.uint8(1) << (indexes & numpy.uint64(7)).astype(numpy.uint8)))
+        self.count += new_items
+        return new_items
+
+    def Contains(self, hashes):
+        """Boolean array: False means the hash is definitely not in the set."""
+        if len(hashes) == 0:
+            return numpy.zeros(0, dtype=bool)
+        indexes = self._BitIndexes(hashes)
+        bytes_ = self.bits[indexes >> numpy.uint64(3)]
+        set_bits = (bytes_ >> (indexes & numpy.uint64(7)).astype(numpy.uint8)) & 1
+        return set_bits.all(axis=1)
+
+    def IsFull(self):
+        return self.count > self.capacity
+
+    def MemoryBytes(self):
+        return self.bits.nbytes
+
+    def EstimatedFalsePositiveRate(self):
+        """(1 - e^(-k n / m))^k for the current number of items."""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    def Save(self, path):
+        """Writes the filter atomically so readers never see a partial file."""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            numpy.savez(f, bits=self.bits,
+                        params=numpy.array([self.capacity, self.num_bits, self.num_hashes, self.count], dtype=numpy.int64),
+                        target_rate=numpy.array([self.target_rate]),
+                        generations=numpy.array(self.generations, dtype=numpy.int64))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def Load(cls, path):
+        with numpy.load(path) as data:
+            bloom = cls.__new__(cls)
+            bloom.capacity, bloom.num_bits, bloom.num_hashes, bloom.count = (int(v) for v in data['params'])
+            bloom.target_rate = float(data['target_rate'][0])
+            bloom.bits = data['bits'].copy()
+            bloom.generations = [int(v) for v in data['generations']] if 'generations' in data else []
+        return bloom
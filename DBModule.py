@@ -3,13 +3,87 @@ import os
 from collections import Counter, deque
 import numpy
 import json
+import zlib
+import struct
+from contextlib import contextmanager
+from multiprocessing import Pool
+import BloomModule
+from BloomModule import BloomFilter
 
 DB_PATH = os.path.join(os.getcwd(), "music_database.db")
 
+# Hash parameters. Bump HASH_PARAMS_VERSION whenever any of these change and
+# run ReindexSongs.py so the fingerprints table is rebuilt from stored peaks.
+HASH_TARGET_ZONE_SIZE = 5
+HASH_ANCHOR_OFFSET = 3
+HASH_FREQ_QUANTISATION = 10
+HASH_PARAMS_VERSION = 1
+
+# Two-stage matcher: SHORTLIST_HASHES query hashes with at most
+# SHORTLIST_MAX_POSTINGS postings each pick SHORTLIST_SIZE candidate songs,
+# which are then verified with every hash.
+SHORTLIST_HASHES = 64
+SHORTLIST_MAX_POSTINGS = 200
+SHORTLIST_SIZE = 10
+MIN_MATCH_SCORE = 5
+
+# Filled in by the search functions so benchmarks can see how much work
+# each query did.
+LastSearchStats = {}
+
+def HashParams():
+    """Returns the current hash parameters as a dict (stored in app_state)."""
+    return {
+        'version': HASH_PARAMS_VERSION,
+        'target_zone_size': HASH_TARGET_ZONE_SIZE,
+        'anchor_offset': HASH_ANCHOR_OFFSET,
+        'freq_quantisation': HASH_FREQ_QUANTISATION,
+    }
+
+def _CreateFingerprintTables(cursor):
+    """Creates the fingerprints and hash_counts tables (main DB or a shard)."""
+    # Only takes effect on a new file; see EnableIncrementalVacuum.
+    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS fingerprints (
+            hash INTEGER NOT NULL,
+            song_id INTEGER NOT NULL,
+            offset INTEGER NOT NULL,
+            FOREIGN KEY(song_id) REFERENCES songs(id)
+        )
+    ''')
+    # (hash, song_id) serves plain hash lookups and lets the verification
+    # stage seek straight to a candidate song's postings for each hash.
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_hash_song ON fingerprints (hash, song_id)')
+    cursor.execute('DROP INDEX IF EXISTS idx_hash')
+    # Makes deleting or replacing one song's fingerprints an index seek.
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_song ON fingerprints (song_id)')
+    # Posting-list length per hash, used to pick selective query hashes.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS hash_counts (
+            hash INTEGER PRIMARY KEY,
+            count INTEGER NOT NULL
+        )
+    ''')
+    # Bumped in the same transaction as every insert, so the Bloom filter
+    # can tell whether it has seen all of this store's hashes.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS fingerprint_generation (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            value INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO fingerprint_generation (id, value) VALUES (0, 0)")
+    cursor.execute("SELECT 1 FROM hash_counts LIMIT 1")
+    if cursor.fetchone() is None:
+        cursor.execute("INSERT INTO hash_counts (hash, count) SELECT hash, COUNT(*) FROM fingerprints GROUP BY hash")
+
 def InitializeDatabase():
     """Create the database tables if they don't exist."""
     with sqlite3.connect(DB_PATH) as conn:
         cursor = conn.cursor()
+        # Lets deletions hand pages back to the OS without a full VACUUM.
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
         # --- MODIFICATION ---
         # Added the 'filepath' column to store the location of the processed MP3.
         cursor.execute('''
@@ -22,25 +96,47 @@ def InitializeDatabase():
                 filepath TEXT
             )
         ''')
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS fingerprints (
-                hash INTEGER NOT NULL,
-                song_id INTEGER NOT NULL,
-                offset INTEGER NOT NULL,
-                FOREIGN KEY(song_id) REFERENCES songs(id)
-            )
-        ''')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_hash ON fingerprints (hash)')
+        _CreateFingerprintTables(cursor)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS app_state (
                 key TEXT PRIMARY KEY,
                 value TEXT
             )
         ''')
+        # Constellation maps are kept so the fingerprints table can be
+        # regenerated without re-decoding every MP3.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS peaks (
+                song_id INTEGER PRIMARY KEY,
+                data BLOB NOT NULL,
+                FOREIGN KEY(song_id) REFERENCES songs(id)
+            )
+        ''')
+        # Only recorded on a fresh database; after that it tracks the
+        # parameters the fingerprints were actually generated with.
+        cursor.execute(
+            "INSERT OR IGNORE INTO app_state (key, value) VALUES ('hash_params', ?)",
+            (json.dumps(HashParams()),)
+        )
         conn.commit()
 
-def AddSong(metadata):
-    """Adds a new song to the songs table and returns its ID."""
+    # Shard files from before fingerprint_generation existed need it too.
+    for index in range(GetShardCount()):
+        with sqlite3.connect(ShardPath(index)) as conn:
+            _CreateFingerprintTables(conn.cursor())
+            conn.commit()
+
+    if not os.path.exists(BloomPath()):
+        RebuildBloomFilter()
+    CheckHashParams()
+
+def AddSong(metadata, fingerprint=None, resolution=None):
+    """
+    Adds a new song to the songs table and returns its ID. If a constellation
+    map is given its peaks (see EncodePeaks) are stored in the same
+    transaction, so there is never a song that ReindexFingerprints cannot
+    re-hash.
+    """
     with sqlite3.connect(DB_PATH) as conn:
         cursor = conn.cursor()
         # --- MODIFICATION ---
@@ -49,15 +145,59 @@ def AddSong(metadata):
             "INSERT INTO songs (title, artist, album, year, filepath) VALUES (?, ?, ?, ?, ?)",
             (metadata['title'], metadata['artist'], metadata['album'], metadata['year'], metadata['filepath'])
         )
+        song_id = cursor.lastrowid
+        if fingerprint is not None:
+            cursor.execute(
+                "INSERT INTO peaks (song_id, data) VALUES (?, ?)",
+                (song_id, EncodePeaks(fingerprint, resolution))
+            )
         conn.commit()
-        return cursor.lastrowid
+        return song_id
+
+# Blob header: bytes per stored value, seconds per frame, Hz per bin.
+_PEAKS_HEADER = struct.Struct('<Bdd')
+
+def EncodePeaks(fingerprint, resolution):
+    """
+    Packs a constellation map into a compressed blob for the peaks table.
+    `resolution` is AudioModule.PeakResolution(): peaks are stored as integer
+    (frame, bin) columns, uint16 when they fit. If any peak is not an exact
+    multiple of the resolution the float64 values are kept instead, so
+    decoding is always lossless.
+    """
+    points = numpy.asarray(fingerprint, dtype=numpy.float64).reshape(-1, 2)
+    time_step, freq_step = resolution
+    frames = numpy.rint(points[:, 0] / time_step)
+    bins = numpy.rint(points[:, 1] / freq_step)
+
+    if numpy.array_equal(frames * time_step, points[:, 0]) and numpy.array_equal(bins * freq_step, points[:, 1]):
+        largest = max(frames.max(initial=0), bins.max(initial=0))
+        dtype = numpy.uint16 if largest <= numpy.iinfo(numpy.uint16).max else numpy.uint32
+        columns = numpy.concatenate([frames, bins]).astype(dtype)
+    else:
+        dtype = numpy.float64
+        columns = numpy.concatenate([points[:, 0], points[:, 1]])
+
+    header = _PEAKS_HEADER.pack(numpy.dtype(dtype).itemsize, time_step, freq_step)
+    return zlib.compress(header + columns.tobytes())
+
+def DecodePeaks(blob):
+    """Inverse of EncodePeaks."""
+    data = zlib.decompress(blob)
+    itemsize, time_step, freq_step = _PEAKS_HEADER.unpack_from(data)
+    dtype = {2: numpy.uint16, 4: numpy.uint32, 8: numpy.float64}[itemsize]
+    columns = numpy.frombuffer(data, dtype=dtype, offset=_PEAKS_HEADER.size).reshape(2, -1)
+    if dtype is numpy.float64:
+        return columns.T.copy()
+    return numpy.column_stack([columns[0] * time_step, columns[1] * freq_step])
 
 def GenerateHashes(fingerprint):
     """
     Generate hashes from the constellation map (fingerprint).
     """
-    target_zone_size = 5
-    anchor_offset = 3
+    target_zone_size = HASH_TARGET_ZONE_SIZE
+    anchor_offset = HASH_ANCHOR_OFFSET
+    freq_quantisation = HASH_FREQ_QUANTISATION
     hashes = []
 
     if len(fingerprint) < target_zone_size + anchor_offset:
@@ -69,8 +209,8 @@ def GenerateHashes(fingerprint):
         target_zone = fingerprint[i + anchor_offset : i + anchor_offset + target_zone_size]
 
         for point_time, point_freq in target_zone:
-            f1 = round(anchor_freq / 10)
-            f2 = round(point_freq / 10)
+            f1 = round(anchor_freq / freq_quantisation)
+            f2 = round(point_freq / freq_quantisation)
             dt = round((point_time - anchor_time) * 1000)
             
             hash_val = (f1 << 23) | (f2 << 14) | (dt & 0x3FFF)
@@ -78,41 +218,411 @@ def GenerateHashes(fingerprint):
             
     return hashes
 
+def _InsertFingerprints(cursor, data_to_insert):
+    """Inserts (hash, song_id, offset) rows and bumps their hash_counts."""
+    cursor.executemany(
+        "INSERT INTO fingerprints (hash, song_id, offset) VALUES (?, ?, ?)",
+        data_to_insert
+    )
+    cursor.executemany(
+        "INSERT INTO hash_counts (hash, count) VALUES (?, ?) "
+        "ON CONFLICT(hash) DO UPDATE SET count = count + excluded.count",
+        Counter(row[0] for row in data_to_insert).items()
+    )
+    cursor.execute("UPDATE fingerprint_generation SET value = value + 1")
+
 def AddFingerprints(song_id, hashes):
-    """Bulk-inserts fingerprint hashes into the database."""
+    """Bulk-inserts fingerprint hashes into the database (or its shards)."""
+    data_to_insert = [(h[0], song_id, h[1]) for h in hashes]
+
+    with _WriterLock():
+        before = _StoreGenerations()
+        for path, rows in _RowsByStore(data_to_insert):
+            with sqlite3.connect(path) as conn:
+                _InsertFingerprints(conn.cursor(), rows)
+                conn.commit()
+
+        _AddToBloomFilter([row[0] for row in data_to_insert], before)
+
+def _RowsByStore(data_to_insert):
+    """Splits fingerprint rows into [(file path, rows)] for every store."""
+    shard_count = GetShardCount()
+    if not shard_count:
+        return [(DB_PATH, data_to_insert)]
+    rows_by_shard = [[] for _ in range(shard_count)]
+    for row in data_to_insert:
+        rows_by_shard[ShardOf(row[0], shard_count)].append(row)
+    return [(ShardPath(index), rows) for index, rows in enumerate(rows_by_shard)]
+
+_writerLockDepth = 0
+
+@contextmanager
+def _WriterLock():
+    """
+    Serialises fingerprint writers across processes (AddSongs.py, ManageSongs.py,
+    ReindexSongs.py...) so each insert and its Bloom filter update happen as
+    one step. An IMMEDIATE transaction on a small lock file is used because
+    it works on every platform SQLite does. Re-entrant within a process.
+    """
+    global _writerLockDepth
+    if _writerLockDepth:
+        _writerLockDepth += 1
+        try:
+            yield
+        finally:
+            _writerLockDepth -= 1
+        return
+
+    conn = sqlite3.connect(f"{os.path.splitext(DB_PATH)[0]}.lock", timeout=600, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        _writerLockDepth = 1
+        try:
+            yield
+        finally:
+            _writerLockDepth = 0
+            conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+def _StoreGenerations():
+    """[shard layout generation, generation of each fingerprint store]."""
+    generations = [GetShardGeneration()]
+    for path in _FingerprintStores():
+        with sqlite3.connect(path) as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT value FROM fingerprint_generation")
+                generations.append(cursor.fetchone()[0])
+            except sqlite3.OperationalError:
+                generations.append(-1)
+    return generations
+
+def _AddToBloomFilter(hash_values, before):
+    """
+    Adds newly stored hashes to the Bloom filter, growing it when full.
+    `before` is _StoreGenerations() from just before the insert; if the
+    filter did not cover exactly that state (a crashed or unlocked writer
+    got in between) it is rebuilt from hash_counts instead.
+    Must be called under _WriterLock.
+    """
+    bloom = GetBloomFilter()
+    if bloom is None:
+        return
+    if bloom.generations != before:
+        RebuildBloomFilter()
+        return
+
+    bloom.Add(hash_values)
+    if bloom.IsFull():
+        RebuildBloomFilter(bloom.capacity * 2)
+    else:
+        bloom.generations = _StoreGenerations()
+        bloom.Save(BloomPath())
+
+def BloomPath():
+    """File holding the Bloom filter over every stored hash, next to the main DB."""
+    return f"{os.path.splitext(DB_PATH)[0]}.bloom"
+
+_bloomCache = {}
+
+def GetBloomFilter():
+    """Loads the Bloom filter, reusing the cached copy until the file changes."""
+    path = BloomPath()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _bloomCache.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, BloomFilter.Load(path))
+        _bloomCache[path] = cached
+    return cached[1]
+
+def RebuildBloomFilter(capacity=None):
+    """
+    Rebuilds the Bloom filter from the distinct hashes in hash_counts. Deleted
+    songs leave stale bits behind, so this is also how to tighten the filter
+    after many deletions.
+    """
+    with _WriterLock():
+        generations = _StoreGenerations()
+        hashes = []
+        for path in _FingerprintStores():
+            with sqlite3.connect(path) as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT hash FROM hash_counts")
+                hashes.extend(row[0] for row in cursor.fetchall())
+
+        if capacity is None:
+            capacity = max(2 * len(hashes), BloomModule.DEFAULT_CAPACITY)
+        bloom = BloomFilter(capacity)
+        bloom.Add(hashes)
+        bloom.generations = generations
+        bloom.Save(BloomPath())
+    return bloom
+
+def IsBloomFilterCurrent(bloom):
+    """True if the filter covers every hash currently stored."""
+    return bloom.generations == _StoreGenerations()
+
+def _PrefilterHashes(hash_values):
+    """
+    Drops query hashes the Bloom filter says are definitely not stored.
+    Records how many were checked and dropped in LastSearchStats. A filter
+    that is behind the database could drop stored hashes, so it is not
+    used at all until a writer rebuilds it.
+    """
+    bloom = GetBloomFilter()
+    if bloom is None or not hash_values:
+        return hash_values
+    if not IsBloomFilterCurrent(bloom):
+        LastSearchStats['bloom_stale'] = True
+        return hash_values
+    keep = bloom.Contains(hash_values)
+    kept = [h for h, present in zip(hash_values, keep) if present]
+    LastSearchStats['bloom_checked'] = len(hash_values)
+    LastSearchStats['bloom_dropped'] = len(hash_values) - len(kept)
+    return kept
+
+def ShardPath(index):
+    """File holding fingerprint shard `index`, next to the main DB."""
+    return f"{os.path.splitext(DB_PATH)[0]}.shard{index}.db"
+
+_SHARD_SEED = 0xD1B54A32D192ED03
+
+def ShardOf(hash_val, shard_count):
+    """
+    Shard that owns a hash. No bit field of the raw hash spreads evenly (dt
+    takes only a handful of values and the frequency bits are skewed to the
+    low bands), so the whole hash is mixed first. Every write path (inserts
+    and ShardDatabase) routes through this function.
+    """
+    return BloomModule.MixHash(hash_val, _SHARD_SEED) % shard_count
+
+def GetShardRowCounts():
+    """Fingerprint rows per shard file."""
+    counts = []
+    for index in range(GetShardCount()):
+        with sqlite3.connect(ShardPath(index)) as conn:
+            counts.append(conn.execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0])
+    return counts
+
+def GetShardCount():
+    """Number of fingerprint shards, or 0 if fingerprints live in the main DB."""
     with sqlite3.connect(DB_PATH) as conn:
         cursor = conn.cursor()
-        data_to_insert = [(h[0], song_id, h[1]) for h in hashes]
-        cursor.executemany(
-            "INSERT INTO fingerprints (hash, song_id, offset) VALUES (?, ?, ?)",
-            data_to_insert
-        )
-        conn.commit()
+        cursor.execute("SELECT value FROM app_state WHERE key = 'shard_count'")
+        result = cursor.fetchone()
+        return int(result[0]) if result else 0
 
-def SearchDatabase(seconds_recorded, fingerprint):
+def GetShardGeneration():
+    """Counter bumped every time ShardDatabase rewrites the shard files."""
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT value FROM app_state WHERE key = 'shard_generation'")
+        result = cursor.fetchone()
+        return int(result[0]) if result else 0
+
+# Rows moved per executemany() when fingerprints are copied between stores.
+_COPY_BATCH_ROWS = 50000
+
+def _CopyRows(source_cursor, select_sql, insert_sql, target_cursors, shard_count=0):
     """
-    Searches the database for a matching song.
+    Streams the rows of `select_sql` into `insert_sql` on target_cursors[0],
+    or, given `shard_count`, on the target cursor of the shard owning each
+    row's hash. Either way the source is read only once.
     """
-    if fingerprint.size == 0:
-        return 0
+    source_cursor.execute(select_sql)
+    while True:
+        rows = source_cursor.fetchmany(_COPY_BATCH_ROWS)
+        if not rows:
+            break
+        if not shard_count:
+            target_cursors[0].executemany(insert_sql, rows)
+            continue
+        rows_by_shard = [[] for _ in range(shard_count)]
+        for row in rows:
+            rows_by_shard[ShardOf(row[0], shard_count)].append(row)
+        for cursor, shard_rows in zip(target_cursors, rows_by_shard):
+            if shard_rows:
+                cursor.executemany(insert_sql, shard_rows)
 
-    query_hashes = GenerateHashes(fingerprint)
-    if not query_hashes:
-        return 0
+def ShardDatabase(shard_count, rebuild_filter=True):
+    """
+    Moves the fingerprints into `shard_count` shard files partitioned by
+    ShardOf, or back into the main DB when `shard_count` is 0. Songs,
+    peaks and app_state always stay in the main DB. The Bloom filter is
+    rebuilt afterwards unless `rebuild_filter` is False.
 
-    hash_values = [h[0] for h in query_hashes]
-    query_offsets = {h[0]: h[1] for h in query_hashes}
+    shard_count only changes in the same transaction that empties or fills
+    the main DB's fingerprints, so an interrupted run leaves the old layout
+    intact; shard files it left behind are not referenced and are replaced
+    on the next run.
+    """
+    fingerprints_sql = ("SELECT hash, song_id, offset FROM fingerprints",
+                        "INSERT INTO fingerprints (hash, song_id, offset) VALUES (?, ?, ?)")
+    hash_counts_sql = ("SELECT hash, count FROM hash_counts",
+                       "INSERT INTO hash_counts (hash, count) VALUES (?, ?)")
 
+    with _WriterLock():
+        old_count = GetShardCount()
+        generation = GetShardGeneration() + 1
+        with sqlite3.connect(DB_PATH) as conn:
+            cursor = conn.cursor()
+
+            # Gather any existing shards back into the main DB first.
+            if old_count:
+                for index in range(old_count):
+                    with sqlite3.connect(ShardPath(index)) as shard_conn:
+                        for select_sql, insert_sql in (fingerprints_sql, hash_counts_sql):
+                            _CopyRows(shard_conn.cursor(), select_sql, insert_sql, [cursor])
+                cursor.execute("INSERT OR REPLACE INTO app_state (key, value) VALUES ('shard_count', '0')")
+                conn.commit()
+                for index in range(old_count):
+                    os.remove(ShardPath(index))
+
+            if shard_count:
+                shard_conns = []
+                try:
+                    for index in range(shard_count):
+                        if os.path.exists(ShardPath(index)):
+                            os.remove(ShardPath(index))
+                        shard_conns.append(sqlite3.connect(ShardPath(index)))
+                        _CreateFingerprintTables(shard_conns[-1].cursor())
+                    shard_cursors = [shard_conn.cursor() for shard_conn in shard_conns]
+                    for select_sql, insert_sql in (fingerprints_sql, hash_counts_sql):
+                        _CopyRows(conn.cursor(), select_sql, insert_sql, shard_cursors, shard_count)
+                    for shard_conn in shard_conns:
+                        shard_conn.commit()
+                finally:
+                    for shard_conn in shard_conns:
+                        shard_conn.close()
+
+                cursor.execute("DELETE FROM fingerprints")
+                cursor.execute("DELETE FROM hash_counts")
+
+            cursor.execute(
+                "INSERT OR REPLACE INTO app_state (key, value) VALUES ('shard_count', ?)",
+                (str(shard_count),)
+            )
+            # Lets running searchers notice their open shard files were replaced.
+            cursor.execute(
+                "INSERT OR REPLACE INTO app_state (key, value) VALUES ('shard_generation', ?)",
+                (str(generation),)
+            )
+            conn.commit()
+            if shard_count:
+                _IncrementalVacuum(conn)
+
+        if rebuild_filter:
+            RebuildBloomFilter()
+
+def _HashStoredPeaks(row):
+    """Pool worker for ReindexFingerprints: (song_id, blob) -> (song_id, rows)."""
+    song_id, blob = row
+    hashes = GenerateHashes(DecodePeaks(blob))
+    return song_id, [(h[0], song_id, h[1]) for h in hashes]
+
+def CountSongsWithoutPeaks():
+    """Songs ingested before peaks were stored; they cannot be reindexed."""
     with sqlite3.connect(DB_PATH) as conn:
         cursor = conn.cursor()
-        placeholders = ','.join(['?'] * len(hash_values))
-        sql_query = f"SELECT song_id, offset, hash FROM fingerprints WHERE hash IN ({placeholders})"
-        cursor.execute(sql_query, hash_values)
-        db_matches = cursor.fetchall()
+        cursor.execute("SELECT COUNT(*) FROM songs WHERE id NOT IN (SELECT song_id FROM peaks)")
+        return cursor.fetchone()[0]
 
-    if not db_matches:
-        return 0
+def ReindexFingerprints(processes=None, drop_missing=False):
+    """
+    Rebuilds the fingerprints table from the stored peaks using the current
+    hash parameters. Hashing is spread over a process pool; the single
+    SQLite connection in this process does all the writing.
+
+    Songs without stored peaks could only keep hashes built with the old
+    parameters, which new queries would never match. So unless
+    `drop_missing` is set (which deletes those songs), nothing is changed
+    while any exist.
+    Returns (songs reindexed, hashes written, songs without stored peaks).
+    """
+    missing = CountSongsWithoutPeaks()
+    if missing and not drop_missing:
+        return 0, 0, missing
+
+    with _WriterLock():
+        # Rebuild in the main DB and re-split afterwards.
+        shard_count = GetShardCount()
+        if shard_count:
+            ShardDatabase(0, rebuild_filter=False)
+
+        with sqlite3.connect(DB_PATH) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT song_id, data FROM peaks")
+            rows = cursor.fetchall()
+
+            if missing:
+                cursor.execute("DELETE FROM songs WHERE id NOT IN (SELECT song_id FROM peaks)")
+            cursor.execute("DELETE FROM fingerprints")
+            # Dropping the indexes first makes the bulk insert much cheaper.
+            cursor.execute("DROP INDEX IF EXISTS idx_hash_song")
+            cursor.execute("DROP INDEX IF EXISTS idx_song")
 
+            total = 0
+            with Pool(processes) as pool:
+                for song_id, data_to_insert in pool.imap_unordered(_HashStoredPeaks, rows, chunksize=4):
+                    cursor.executemany(
+                        "INSERT INTO fingerprints (hash, song_id, offset) VALUES (?, ?, ?)",
+                        data_to_insert
+                    )
+                    total += len(data_to_insert)
+
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_hash_song ON fingerprints (hash, song_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_song ON fingerprints (song_id)')
+            cursor.execute("DELETE FROM hash_counts")
+            cursor.execute("INSERT INTO hash_counts (hash, count) SELECT hash, COUNT(*) FROM fingerprints GROUP BY hash")
+            # Every hash may have changed: invalidates the Bloom filter.
+            cursor.execute("UPDATE fingerprint_generation SET value = value + 1")
+            cursor.execute(
+                "INSERT OR REPLACE INTO app_state (key, value) VALUES ('hash_params', ?)",
+                (json.dumps(HashParams()),)
+            )
+            conn.commit()
+
+        if shard_count:
+            ShardDatabase(shard_count, rebuild_filter=False)
+        RebuildBloomFilter()
+
+    return len(rows), total, missing
+
+def GetHashParams():
+    """Returns the hash parameters the stored fingerprints were built with."""
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT value FROM app_state WHERE key = 'hash_params'")
+        result = cursor.fetchone()
+        return json.loads(result[0]) if result else None
+
+_hashParamsChecked = False
+
+def CheckHashParams():
+    """
+    Warns (once per process) if the stored fingerprints were built with
+    different hash parameters than the current constants: queries would
+    then silently never match until ReindexSongs.py is run.
+    Returns True if they agree.
+    """
+    global _hashParamsChecked
+    stored = GetHashParams()
+    matches = stored is None or stored == HashParams()
+    if not matches and not _hashParamsChecked:
+        print(f"⚠️  Stored fingerprints use hash parameters {stored}, but the code uses {HashParams()}.")
+        print("   Searches will not match until you run 'ReindexSongs.py'.")
+    _hashParamsChecked = True
+    return matches
+
+def _ScoreSongs(db_matches, query_offsets):
+    """
+    Builds each song's histogram of (db offset - query offset) and returns
+    {song_id: height of its tallest bin}.
+    """
     time_deltas = {}
     for song_id, db_offset, h in db_matches:
         query_offset = query_offsets.get(h)
@@ -122,24 +632,157 @@ def SearchDatabase(seconds_recorded, fingerprint):
                 time_deltas[song_id] = []
             time_deltas[song_id].append(delta)
 
-    best_match_id = 0
-    max_score = 0
-    
+    scores = {}
     for song_id, deltas in time_deltas.items():
         if not deltas:
             continue
         most_common_delta, score = Counter(deltas).most_common(1)[0]
-        
+        scores[song_id] = score
+    return scores
+
+def _BestMatch(scores):
+    """Returns song metadata for the top score, or 0 if it is too weak."""
+    best_match_id = 0
+    max_score = 0
+    # Ties go to the lowest song_id so the result does not depend on the
+    # order rows came back in (sharded and unsharded searches agree).
+    for song_id, score in sorted(scores.items()):
         if score > max_score:
             max_score = score
             best_match_id = song_id
-    
+
     # This threshold might need tuning for short clips
-    if max_score < 5:
+    if max_score < MIN_MATCH_SCORE:
         return 0
-        
+
     return GetSongById(best_match_id)
 
+_SAMPLE_SEED = 0x9E3779B97F4A7C15
+
+def _SelectiveHashes(hash_counts):
+    """
+    The SHORTLIST_HASHES query hashes used to build the shortlist. Taking
+    strictly the shortest posting lists fails when the song is stored more
+    than once (album and compilation copies): all of its hashes then have at
+    least two postings and the rarest ones are all noise. So the sample is
+    an even spread (ordered by a mix of the hash, so sharded and unsharded
+    searches pick the same ones) of the hashes with at most
+    SHORTLIST_MAX_POSTINGS postings, topped up with the shortest of the rest.
+    """
+    def SampleOrder(row):
+        h, count = row
+        if count <= SHORTLIST_MAX_POSTINGS:
+            return (0, BloomModule.MixHash(h, _SAMPLE_SEED))
+        return (1, count, h)
+    return [h for h, _ in sorted(hash_counts, key=SampleOrder)[:SHORTLIST_HASHES]]
+
+def _Shortlist(sample_scores):
+    """Top SHORTLIST_SIZE songs by sample score, ties to the lowest song_id."""
+    return sorted(sample_scores, key=lambda song_id: (-sample_scores[song_id], song_id))[:SHORTLIST_SIZE]
+
+def SearchDatabaseSinglePass(seconds_recorded, fingerprint):
+    """
+    Original matcher: fetches every posting for every query hash and scores
+    every song that shares at least one hash. Kept for benchmarking.
+    """
+    LastSearchStats.clear()
+    if fingerprint.size == 0:
+        return 0
+
+    if GetShardCount():
+        import ShardModule
+        return ShardModule.SearchShardsSinglePass(fingerprint)
+
+    query_hashes = GenerateHashes(fingerprint)
+    if not query_hashes:
+        return 0
+
+    hash_values = [h[0] for h in query_hashes]
+    query_offsets = {h[0]: h[1] for h in query_hashes}
+
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+        placeholders = ','.join(['?'] * len(hash_values))
+        sql_query = f"SELECT song_id, offset, hash FROM fingerprints WHERE hash IN ({placeholders})"
+        cursor.execute(sql_query, hash_values)
+        db_matches = cursor.fetchall()
+
+    LastSearchStats['rows_read'] = len(db_matches)
+    if not db_matches:
+        return 0
+
+    scores = _ScoreSongs(db_matches, query_offsets)
+    LastSearchStats['candidates'] = len(scores)
+    return _BestMatch(scores)
+
+def SearchDatabase(seconds_recorded, fingerprint):
+    """
+    Searches the database for a matching song in two stages:
+    1. Shortlist: score songs using only a sample of SHORTLIST_HASHES query
+       hashes without huge posting lists (see _SelectiveHashes) and keep
+       the top SHORTLIST_SIZE.
+    2. Verify: fetch postings for every query hash, restricted to the
+       shortlisted songs, and pick the best offset alignment.
+    """
+    LastSearchStats.clear()
+    if not _hashParamsChecked:
+        CheckHashParams()
+    if fingerprint.size == 0:
+        return 0
+
+    if GetShardCount():
+        import ShardModule
+        return ShardModule.SearchShards(fingerprint)
+
+    query_hashes = GenerateHashes(fingerprint)
+    if not query_hashes:
+        return 0
+
+    query_offsets = {h[0]: h[1] for h in query_hashes}
+    hash_values = _PrefilterHashes(list(query_offsets))
+    if not hash_values:
+        return 0
+
+    with sqlite3.connect(DB_PATH) as conn:
+        cursor = conn.cursor()
+
+        placeholders = ','.join(['?'] * len(hash_values))
+        cursor.execute(f"SELECT hash, count FROM hash_counts WHERE hash IN ({placeholders})", hash_values)
+        hash_counts = cursor.fetchall()
+        rows_read = len(hash_counts)
+        if not hash_counts:
+            LastSearchStats['rows_read'] = rows_read
+            return 0
+
+        # Stage 1: shortlist candidates from a sample of selective hashes.
+        sample = _SelectiveHashes(hash_counts)
+        placeholders = ','.join(['?'] * len(sample))
+        cursor.execute(f"SELECT song_id, offset, hash FROM fingerprints WHERE hash IN ({placeholders})", sample)
+        sample_matches = cursor.fetchall()
+        rows_read += len(sample_matches)
+
+        shortlist = _Shortlist(_ScoreSongs(sample_matches, query_offsets))
+        if not shortlist:
+            LastSearchStats['rows_read'] = rows_read
+            return 0
+
+        # Stage 2: full postings, but only for the shortlisted songs. Hashes
+        # absent from hash_counts cannot match and are left out.
+        present = [h for h, _ in hash_counts]
+        hash_placeholders = ','.join(['?'] * len(present))
+        song_placeholders = ','.join(['?'] * len(shortlist))
+        cursor.execute(
+            f"SELECT song_id, offset, hash FROM fingerprints "
+            f"WHERE hash IN ({hash_placeholders}) AND song_id IN ({song_placeholders})",
+            present + shortlist
+        )
+        db_matches = cursor.fetchall()
+        rows_read += len(db_matches)
+
+    LastSearchStats['rows_read'] = rows_read
+    LastSearchStats['candidates'] = len(shortlist)
+    return _BestMatch(_ScoreSongs(db_matches, query_offsets))
+
 def GetSongById(song_id):
     """Retrieves song metadata by its ID."""
     with sqlite3.connect(DB_PATH) as conn:
@@ -149,6 +792,193 @@ def GetSongById(song_id):
         result = cursor.fetchone()
         return dict(result) if result else None
 
+def ListSongs():
+    """Returns every song's metadata plus how many fingerprints it has."""
+    counts = Counter()
+    for path in _FingerprintStores():
+        with sqlite3.connect(path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT song_id, COUNT(*) FROM fingerprints GROUP BY song_id")
+            counts.update(dict(cursor.fetchall()))
+
+    with sqlite3.connect(DB_PATH) as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM songs ORDER BY id")
+        songs = [dict(row) for row in cursor.fetchall()]
+    for song in songs:
+        song['fingerprints'] = counts[song['id']]
+    return songs
+
+def _FingerprintStores():
+    """Paths of the files holding the fingerprints table."""
+    shard_count = GetShardCount()
+    if shard_count:
+        return [ShardPath(index) for index in range(shard_count)]
+    return [DB_PATH]
+
+def _IncrementalVacuum(conn):
+    """Returns free pages to the OS. executescript is needed because a plain
+    execute() only steps the pragma once, which frees a single page."""
+    conn.executescript("PRAGMA incremental_vacuum;")
+
+@contextmanager
+def _StoreTransactions():
+    """
+    Yields {path: connection} for every fingerprint store and the main DB.
+    Nothing is committed until the block has finished with every store, and
+    all of them are rolled back if it raises, so a song is never left half
+    changed. Freed pages are handed back afterwards.
+    """
+    connections = {path: sqlite3.connect(path) for path in dict.fromkeys(_FingerprintStores() + [DB_PATH])}
+    try:
+        yield connections
+        for conn in connections.values():
+            conn.commit()
+    except Exception:
+        for conn in connections.values():
+            conn.rollback()
+        raise
+    finally:
+        for conn in connections.values():
+            _IncrementalVacuum(conn)
+            conn.close()
+
+def DeleteFingerprints(song_id):
+    """
+    Removes one song's fingerprints (via idx_song), decrements hash_counts
+    and hands the freed pages back with an incremental vacuum.
+    Returns the number of fingerprints removed.
+    """
+    with _WriterLock(), _StoreTransactions() as connections:
+        return sum(_DeleteSongFingerprints(connections[path].cursor(), song_id)
+                   for path in _FingerprintStores())
+
+def _DeleteSongFingerprints(cursor, song_id):
+    """Deletes one song's rows from a store and its hash_counts; no commit."""
+    cursor.execute("SELECT hash, COUNT(*) FROM fingerprints WHERE song_id = ? GROUP BY hash", (song_id,))
+    song_counts = cursor.fetchall()
+    cursor.executemany(
+        "UPDATE hash_counts SET count = count - ? WHERE hash = ?",
+        [(count, h) for h, count in song_counts]
+    )
+    # Only the hashes just decremented can have dropped to zero; a bare
+    # "WHERE count <= 0" would scan the whole table on every delete.
+    cursor.executemany(
+        "DELETE FROM hash_counts WHERE hash = ? AND count <= 0",
+        [(h,) for h, _ in song_counts]
+    )
+    cursor.execute("DELETE FROM fingerprints WHERE song_id = ?", (song_id,))
+    return cursor.rowcount
+
+def ReplaceSong(song_id, metadata, hashes, fingerprint, resolution):
+    """
+    Swaps a song's fingerprints, peaks and metadata for new ones, keeping
+    its ID. Each store is changed in one transaction, and nothing is
+    committed until every store has been updated, so a failure part way
+    leaves the old song intact. Returns the number of old fingerprints removed.
+    """
+    data_to_insert = [(h[0], song_id, h[1]) for h in hashes]
+    with _WriterLock():
+        before = _StoreGenerations()
+        with _StoreTransactions() as connections:
+            removed = 0
+            for path, rows in _RowsByStore(data_to_insert):
+                cursor = connections[path].cursor()
+                removed += _DeleteSongFingerprints(cursor, song_id)
+                _InsertFingerprints(cursor, rows)
+
+            cursor = connections[DB_PATH].cursor()
+            cursor.execute(
+                "INSERT OR REPLACE INTO peaks (song_id, data) VALUES (?, ?)",
+                (song_id, EncodePeaks(fingerprint, resolution))
+            )
+            cursor.execute(
+                "UPDATE songs SET title = ?, artist = ?, album = ?, year = ?, filepath = ? WHERE id = ?",
+                (metadata['title'], metadata['artist'], metadata['album'], metadata['year'], metadata['filepath'], song_id)
+            )
+        _AddToBloomFilter([row[0] for row in data_to_insert], before)
+    return removed
+
+def DeleteSong(song_id):
+    """
+    Removes a song, its peaks and its fingerprints, committing every store
+    together (one transaction when unsharded). Returns fingerprints removed.
+    """
+    with _WriterLock(), _StoreTransactions() as connections:
+        removed = sum(_DeleteSongFingerprints(connections[path].cursor(), song_id)
+                      for path in _FingerprintStores())
+        cursor = connections[DB_PATH].cursor()
+        cursor.execute("DELETE FROM peaks WHERE song_id = ?", (song_id,))
+        cursor.execute("DELETE FROM songs WHERE id = ?", (song_id,))
+    return removed
+
+def EnableIncrementalVacuum():
+    """
+    Switches existing database files to auto_vacuum=INCREMENTAL. SQLite can
+    only change this with one full VACUUM, so this is a one-off migration
+    for databases created before deletions were supported.
+    """
+    for path in dict.fromkeys([DB_PATH] + _FingerprintStores()):
+        with sqlite3.connect(path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("PRAGMA auto_vacuum")
+            if cursor.fetchone()[0] != 2:
+                cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                cursor.execute("VACUUM")
+
+def GetStorageReport():
+    """
+    Returns {table or index name: bytes} summed over the main DB and any
+    shards, plus '(free pages)' for space not yet handed back. Per-object
+    sizes need SQLite's dbstat table; without it only totals are given.
+    """
+    report = Counter()
+    for path in dict.fromkeys([DB_PATH] + _FingerprintStores()):
+        with sqlite3.connect(path) as conn:
+            cursor = conn.cursor()
+            page_size = cursor.execute("PRAGMA page_size").fetchone()[0]
+            report['(free pages)'] += cursor.execute("PRAGMA freelist_count").fetchone()[0] * page_size
+            try:
+                cursor.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")
+                report.update(dict(cursor.fetchall()))
+            except sqlite3.OperationalError:
+                report['(total)'] += cursor.execute("PRAGMA page_count").fetchone()[0] * page_size
+    return dict(report)
+
+def GetBloomReport(samples=100000):
+    """
+    Memory use and false-positive rate of the Bloom filter. The measured
+    rate comes from random hashes, using hash_counts to weed out any that
+    are actually stored.
+    """
+    bloom = GetBloomFilter()
+    if bloom is None:
+        return None
+
+    probes = numpy.random.default_rng().integers(0, 1 << 32, samples)
+    positives = [int(h) for h, present in zip(probes, bloom.Contains(probes)) if present]
+    stored = 0
+    for path in _FingerprintStores():
+        with sqlite3.connect(path) as conn:
+            cursor = conn.cursor()
+            for start in range(0, len(positives), 500):
+                chunk = positives[start:start + 500]
+                placeholders = ','.join(['?'] * len(chunk))
+                cursor.execute(f"SELECT COUNT(*) FROM hash_counts WHERE hash IN ({placeholders})", chunk)
+                stored += cursor.fetchone()[0]
+    absent = samples - stored
+
+    return {
+        'memory_bytes': bloom.MemoryBytes(),
+        'items': bloom.count,
+        'capacity': bloom.capacity,
+        'hash_functions': bloom.num_hashes,
+        'estimated_fpr': bloom.EstimatedFalsePositiveRate(),
+        'measured_fpr': (len(positives) - stored) / absent if absent else 0.0,
+        'current': IsBloomFilterCurrent(bloom),
+    }
+
 def GetLastMatches(limit=10):
     """Gets the list of last matched songs from the database."""
     with sqlite3.connect(DB_PATH) as conn:
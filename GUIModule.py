@@ -129,18 +129,7 @@ class MainApplication(tk.Frame):
         FIX: This function now loops internally, trying to identify the song
         as the recording grows. It's more robust than the previous recursion.
         """
-        self.songMetaData = 0
-        while self.recordAudioThread.is_alive() and not self.songMetaData:
-            # Generate the fingerprint from the entire file so far.
-            # AudioModule is now resilient to file-read errors.
-            fingerprint = AudioModule.GenerateConstellationMap(filepath)
-            
-            # Only search if we have a valid fingerprint
-            if fingerprint.size > 0:
-                self.songMetaData = DBModule.SearchDatabase(self.secondsPassed, fingerprint)
-
-            # Wait a moment before re-processing the file
-            time.sleep(1.0)
+        self.songMetaData = AudioModule.IdentifyWhileRecording(self.recordAudioThread, filepath, lambda: self.secondsPassed)
         
         # --- Finalization (runs after loop ends) ---
         self.finish = timer() - self.start
@@ -0,0 +1,135 @@
+import os
+import sys
+import AudioModule
+import DBModule
+from AddSongs import extract_metadata, convert_mp3_to_wav
+
+USAGE = """Usage:
+  python ManageSongs.py list
+  python ManageSongs.py delete <song id>
+  python ManageSongs.py replace <song id> <mp3 path>
+  python ManageSongs.py report
+  python ManageSongs.py rebuild-filter   (rebuild the Bloom filter, e.g. after many deletions)
+  python ManageSongs.py migrate      (one-off full VACUUM to enable incremental vacuum)"""
+
+def print_storage_report(before=None):
+    """Prints table/index sizes, with the change since `before` if given."""
+    report = DBModule.GetStorageReport()
+    for name in sorted(set(report) | set(before or {})):
+        size = report.get(name, 0)
+        line = f"  {name:<20} {size / 1e6:10.2f} MB"
+        if before is not None:
+            line += f"  ({(size - before.get(name, 0)) / 1e6:+.2f} MB)"
+        print(line)
+    return report
+
+def print_bloom_report():
+    report = DBModule.GetBloomReport()
+    if report is None:
+        print("  No Bloom filter found.")
+        return
+    print(f"  Bloom filter: {report['memory_bytes'] / 1e6:.2f} MB, {report['items']} / {report['capacity']} hashes, "
+          f"{report['hash_functions']} hash functions")
+    print(f"  False-positive rate: {report['estimated_fpr'] * 100:.2f}% estimated, "
+          f"{report['measured_fpr'] * 100:.2f}% measured")
+    if not report['current']:
+        print("  ⚠️  The filter is behind the database and is not being used. Run 'ManageSongs.py rebuild-filter'.")
+
+def list_songs():
+    songs = DBModule.ListSongs()
+    if not songs:
+        print("❌ Database is empty. Please add songs using 'AddSongs.py' first.")
+        return
+    for song in songs:
+        print(f"{song['id']:>5}  {song['title']} by {song['artist']}  ({song['fingerprints']} hashes)")
+    print(f"\n{len(songs)} songs")
+
+def delete_song(song_id):
+    song = DBModule.GetSongById(song_id)
+    if not song:
+        print(f"❌ No song with ID {song_id}.")
+        return
+    before = DBModule.GetStorageReport()
+    removed = DBModule.DeleteSong(song_id)
+    print(f"🗑️  Deleted '{song['title']}' by {song['artist']} ({removed} hashes)")
+    print_storage_report(before)
+
+def replace_song(song_id, mp3_path, processed_folder="Processed"):
+    """Re-fingerprints a song from a new MP3, keeping its ID."""
+    song = DBModule.GetSongById(song_id)
+    if not song:
+        print(f"❌ No song with ID {song_id}.")
+        return
+    if not os.path.exists(mp3_path):
+        print(f"❌ File not found: {mp3_path}")
+        return
+
+    temp_wav_dir = os.path.join(os.getcwd(), "temp_wavs")
+    if not os.path.exists(temp_wav_dir):
+        os.makedirs(temp_wav_dir)
+    wav_path = os.path.join(temp_wav_dir, os.path.splitext(os.path.basename(mp3_path))[0] + ".wav")
+    try:
+        if not convert_mp3_to_wav(mp3_path, wav_path):
+            return
+        fingerprint = AudioModule.GenerateConstellationMap(wav_path)
+    finally:
+        if os.path.exists(wav_path):
+            os.remove(wav_path)
+        if not os.listdir(temp_wav_dir):
+            os.rmdir(temp_wav_dir)
+    if fingerprint.size == 0:
+        print("⚠️  Fingerprint generation failed. Song left unchanged.")
+        return
+
+    processed_path = os.path.join(os.getcwd(), processed_folder)
+    if not os.path.exists(processed_path):
+        os.makedirs(processed_path)
+    metadata = extract_metadata(mp3_path)
+    metadata['filepath'] = os.path.join(processed_path, os.path.basename(mp3_path))
+
+    before = DBModule.GetStorageReport()
+    hashes = DBModule.GenerateHashes(fingerprint)
+    removed = DBModule.ReplaceSong(song_id, metadata, hashes, fingerprint, AudioModule.PeakResolution(44100))
+
+    # The new MP3 takes over from the old processed file.
+    old_path = song.get('filepath')
+    try:
+        if os.path.abspath(mp3_path) != metadata['filepath']:
+            os.replace(mp3_path, metadata['filepath'])
+        if old_path and old_path != metadata['filepath'] and os.path.exists(old_path):
+            os.remove(old_path)
+    except Exception as e:
+        print(f"⚠️  Could not update processed files: {e}")
+
+    print(f"🔁 Replaced song {song_id}: {removed} old hashes → {len(hashes)} new hashes")
+    print(f"   Now: '{metadata['title']}' by {metadata['artist']}")
+    print_storage_report(before)
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if not os.path.exists(DBModule.DB_PATH):
+        print(f"❌ Database file not found at '{DBModule.DB_PATH}'.")
+        print("Please run 'AddSongs.py' first to create and populate the database.")
+        sys.exit(1)
+    DBModule.InitializeDatabase()
+
+    if args == ["list"]:
+        list_songs()
+    elif len(args) == 2 and args[0] == "delete":
+        delete_song(int(args[1]))
+    elif len(args) == 3 and args[0] == "replace":
+        replace_song(int(args[1]), args[2])
+    elif args == ["report"]:
+        print_storage_report()
+        print_bloom_report()
+    elif args == ["rebuild-filter"]:
+        DBModule.RebuildBloomFilter()
+        print("✅ Bloom filter rebuilt.")
+        print_bloom_report()
+    elif args == ["migrate"]:
+        before = DBModule.GetStorageReport()
+        DBModule.EnableIncrementalVacuum()
+        print("✅ Incremental vacuum enabled.")
+        print_storage_report(before)
+    else:
+        print(USAGE)
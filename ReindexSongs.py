@@ -0,0 +1,35 @@
+import os
+import sys
+import time
+import DBModule
+
+def reindex_catalogue(processes=None, drop_missing=False):
+    """Regenerates every song's hashes from its stored constellation map."""
+    if not os.path.exists(DBModule.DB_PATH):
+        print(f"❌ Database file not found at '{DBModule.DB_PATH}'.")
+        print("Please run 'AddSongs.py' first to create and populate the database.")
+        return
+
+    DBModule.InitializeDatabase()
+    old_params = DBModule.GetHashParams()
+    new_params = DBModule.HashParams()
+    print(f"🔧 Stored hash parameters:  {old_params}")
+    print(f"🔧 Current hash parameters: {new_params}")
+    print(f"⚙️  Re-hashing with {processes or os.cpu_count()} worker processes...")
+
+    start = time.time()
+    songs, hashes, missing = DBModule.ReindexFingerprints(processes, drop_missing)
+    elapsed = time.time() - start
+
+    print("=" * 50)
+    if missing and not drop_missing:
+        print(f"❌ {missing} songs have no stored peaks, so their hashes can't be rebuilt. Nothing was changed.")
+        print("   Re-fingerprint them with 'ManageSongs.py replace', or rerun with --drop-missing to delete them.")
+        return
+    if missing:
+        print(f"🗑️  Deleted {missing} songs that had no stored peaks.")
+    print(f"✅ Reindexed {songs} songs ({hashes} hashes) in {elapsed:.2f} seconds")
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--drop-missing"]
+    reindex_catalogue(int(args[0]) if args else None, "--drop-missing" in sys.argv[1:])
@@ -0,0 +1,200 @@
+import sqlite3
+import atexit
+from collections import Counter
+from multiprocessing import Process, Pipe
+from timeit import default_timer as timer
+import DBModule
+
+def _Histograms(cursor, query_offsets, song_ids):
+    """
+    {song_id: Counter(db offset - query offset)} over the postings of the
+    hashes in `query_offsets`, optionally restricted to `song_ids`.
+    Returns (histograms, rows read).
+    """
+    histograms = {}
+    rows_read = 0
+    if not query_offsets:
+        return histograms, rows_read
+
+    hash_values = list(query_offsets)
+    placeholders = ','.join(['?'] * len(hash_values))
+    sql_query = f"SELECT song_id, offset, hash FROM fingerprints WHERE hash IN ({placeholders})"
+    if song_ids is not None:
+        sql_query += f" AND song_id IN ({','.join(['?'] * len(song_ids))})"
+        hash_values += list(song_ids)
+    cursor.execute(sql_query, hash_values)
+    for song_id, db_offset, h in cursor.fetchall():
+        rows_read += 1
+        if song_id not in histograms:
+            histograms[song_id] = Counter()
+        histograms[song_id][db_offset - query_offsets[h]] += 1
+    return histograms, rows_read
+
+def _ShardWorker(shard_path, pipe):
+    """
+    Runs in its own process and keeps one shard open for its lifetime.
+    Requests are:
+      ('counts', [hash, ...])                      -> [(hash, count), ...]
+      ('histograms', {hash: query_offset}, songs)  -> {song_id: Counter}
+    where `songs` is None or a list of song_ids to restrict postings to.
+    Every reply is (result, rows read, seconds spent). None shuts down.
+    """
+    conn = sqlite3.connect(shard_path)
+    cursor = conn.cursor()
+    try:
+        while True:
+            request = pipe.recv()
+            if request is None:
+                break
+
+            start = timer()
+            if request[0] == 'counts':
+                hash_values = request[1]
+                result = []
+                if hash_values:
+                    placeholders = ','.join(['?'] * len(hash_values))
+                    cursor.execute(f"SELECT hash, count FROM hash_counts WHERE hash IN ({placeholders})", hash_values)
+                    result = cursor.fetchall()
+                rows_read = len(result)
+            else:
+                result, rows_read = _Histograms(cursor, request[1], request[2])
+
+            pipe.send((result, rows_read, timer() - start))
+    finally:
+        conn.close()
+        pipe.close()
+
+class ShardSearcher:
+    """A pool of worker processes, one per shard file."""
+
+    def __init__(self, shard_count=None):
+        self.shard_count = shard_count or DBModule.GetShardCount()
+        self.generation = DBModule.GetShardGeneration()
+        self.workers = []
+        for index in range(self.shard_count):
+            parent_end, child_end = Pipe()
+            process = Process(target=_ShardWorker, args=(DBModule.ShardPath(index), child_end), daemon=True)
+            process.start()
+            child_end.close()
+            self.workers.append((process, parent_end))
+
+    def _Split(self, hash_values):
+        """Groups hashes by the shard that owns them."""
+        by_shard = [[] for _ in range(self.shard_count)]
+        for h in hash_values:
+            by_shard[DBModule.ShardOf(h, self.shard_count)].append(h)
+        return by_shard
+
+    def _FanOut(self, requests):
+        """Sends one request per shard and collects the results, adding rows
+        read and per-shard time to DBModule.LastSearchStats."""
+        for (process, pipe), request in zip(self.workers, requests):
+            pipe.send(request)
+
+        stats = DBModule.LastSearchStats
+        stats.setdefault('rows_read', 0)
+        stats.setdefault('shard_times', [0.0] * self.shard_count)
+        results = []
+        for index, (process, pipe) in enumerate(self.workers):
+            result, rows_read, elapsed = pipe.recv()
+            stats['rows_read'] += rows_read
+            stats['shard_times'][index] += elapsed
+            results.append(result)
+        return results
+
+    def _MergedScores(self, query_offsets, song_ids=None):
+        """Merges every shard's offset histograms into {song_id: best bin}."""
+        requests = [('histograms', {h: query_offsets[h] for h in shard_hashes}, song_ids)
+                    for shard_hashes in self._Split(query_offsets)]
+        merged = {}
+        for histograms in self._FanOut(requests):
+            for song_id, deltas in histograms.items():
+                if song_id not in merged:
+                    merged[song_id] = deltas
+                else:
+                    merged[song_id].update(deltas)
+        return {song_id: max(deltas.values()) for song_id, deltas in merged.items()}
+
+    def _QueryOffsets(self, fingerprint):
+        """Query {hash: offset} after the Bloom prefilter, or None if empty."""
+        if fingerprint.size == 0:
+            return None
+        query_hashes = DBModule.GenerateHashes(fingerprint)
+        if not query_hashes:
+            return None
+        query_offsets = {h[0]: h[1] for h in query_hashes}
+        present = DBModule._PrefilterHashes(list(query_offsets))
+        return {h: query_offsets[h] for h in present} or None
+
+    def Search(self, fingerprint):
+        """
+        DBModule.SearchDatabase's two-stage match run across the shards: the
+        hash_counts lookup, the shortlist postings and the song-filtered
+        verification postings each fan out to the shard owning each hash.
+        Returns the same result as SearchDatabase on the unsharded DB.
+        """
+        DBModule.LastSearchStats.clear()
+        query_offsets = self._QueryOffsets(fingerprint)
+        if query_offsets is None:
+            return 0
+
+        hash_counts = [row for rows in self._FanOut([('counts', hashes) for hashes in self._Split(query_offsets)])
+                       for row in rows]
+        if not hash_counts:
+            return 0
+
+        sample = DBModule._SelectiveHashes(hash_counts)
+        shortlist = DBModule._Shortlist(self._MergedScores({h: query_offsets[h] for h in sample}))
+        if not shortlist:
+            return 0
+
+        present = {h: query_offsets[h] for h, _ in hash_counts}
+        scores = self._MergedScores(present, shortlist)
+        DBModule.LastSearchStats['candidates'] = len(shortlist)
+        return DBModule._BestMatch(scores)
+
+    def SearchSinglePass(self, fingerprint):
+        """
+        DBModule.SearchDatabaseSinglePass across the shards: every posting of
+        every query hash, merged into per-song offset histograms.
+        """
+        DBModule.LastSearchStats.clear()
+        query_offsets = self._QueryOffsets(fingerprint)
+        if query_offsets is None:
+            return 0
+
+        scores = self._MergedScores(query_offsets)
+        DBModule.LastSearchStats['candidates'] = len(scores)
+        if not scores:
+            return 0
+        return DBModule._BestMatch(scores)
+
+    def Close(self):
+        """Stops the worker processes."""
+        for process, pipe in self.workers:
+            try:
+                pipe.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for process, pipe in self.workers:
+            process.join(timeout=5)
+            pipe.close()
+        self.workers = []
+
+_searcher = None
+
+def _SharedSearcher():
+    """A ShardSearcher started on first use and restarted if the shards change."""
+    global _searcher
+    if _searcher is None or _searcher.generation != DBModule.GetShardGeneration():
+        if _searcher is not None:
+            _searcher.Close()
+        _searcher = ShardSearcher()
+        atexit.register(_searcher.Close)
+    return _searcher
+
+def SearchShards(fingerprint):
+    return _SharedSearcher().Search(fingerprint)
+
+def SearchShardsSinglePass(fingerprint):
+    return _SharedSearcher().SearchSinglePass(fingerprint)
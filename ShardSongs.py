@@ -0,0 +1,35 @@
+import os
+import sys
+import time
+import DBModule
+
+def shard_catalogue(shard_count):
+    """Splits the fingerprints into `shard_count` shard files (0 = merge back)."""
+    if not os.path.exists(DBModule.DB_PATH):
+        print(f"❌ Database file not found at '{DBModule.DB_PATH}'.")
+        print("Please run 'AddSongs.py' first to create and populate the database.")
+        return
+
+    DBModule.InitializeDatabase()
+    old_count = DBModule.GetShardCount()
+    print(f"🔧 Current shards: {old_count or 'none'}  →  requested: {shard_count or 'none'}")
+
+    start = time.time()
+    DBModule.ShardDatabase(shard_count)
+    elapsed = time.time() - start
+
+    print("=" * 50)
+    if shard_count:
+        row_counts = DBModule.GetShardRowCounts()
+        total = sum(row_counts) or 1
+        for index, rows in enumerate(row_counts):
+            path = DBModule.ShardPath(index)
+            print(f"  {os.path.basename(path)}: {rows} rows ({rows / total * 100:.1f}%), "
+                  f"{os.path.getsize(path) / 1e6:.1f} MB")
+    print(f"✅ Done in {elapsed:.2f} seconds")
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python ShardSongs.py <shard count, 0 to unshard>")
+    else:
+        shard_catalogue(int(sys.argv[1]))
@@ -0,0 +1,199 @@
+import os
+import sys
+import random
+import sqlite3
+import time
+import shutil
+import numpy
+from pydub import AudioSegment
+import AudioModule
+import DBModule
+
+# --- BENCHMARK CONFIGURATION ---
+CLIP_DURATION_MS = 7000
+CLIPS_PER_SONG = 3
+TEMP_RECORDING_PATH = "temp_benchmark.wav"
+
+# Duplicate-recording case: every tested song is stored a second time (as
+# album and compilation copies would be) in a scratch copy of the DB, and
+# each clip gets this fraction of extra random peaks on top, like room noise.
+DUPLICATE_DB_PATH = "benchmark_duplicates.db"
+NOISE_PEAK_FRACTION = 0.5
+
+MATCHERS = [
+    ("single-pass", DBModule.SearchDatabaseSinglePass),
+    ("two-stage", DBModule.SearchDatabase),
+]
+
+def get_all_songs_from_db():
+    """Fetches all songs with their ID and filepath from the database."""
+    with sqlite3.connect(DBModule.DB_PATH) as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, title, artist, filepath FROM songs")
+        return [dict(row) for row in cursor.fetchall()]
+
+def make_clip_fingerprint(audio):
+    """Cuts a random clip from the song and returns its constellation map."""
+    start_time = random.randint(0, len(audio) - CLIP_DURATION_MS)
+    clip = audio[start_time : start_time + CLIP_DURATION_MS]
+    clip.set_channels(1).set_frame_rate(44100).export(TEMP_RECORDING_PATH, format="wav")
+    return AudioModule.GenerateConstellationMap(TEMP_RECORDING_PATH)
+
+def add_noise_peaks(fingerprint, fraction):
+    """Adds `fraction` * len(fingerprint) random peaks at the clip's own frame
+    times, up to its highest frequency, keeping the map in time order."""
+    count = int(len(fingerprint) * fraction)
+    noise = numpy.column_stack([
+        numpy.random.choice(fingerprint[:, 0], count),
+        numpy.random.uniform(0, fingerprint[:, 1].max(), count),
+    ])
+    noisy = numpy.concatenate([fingerprint, noise])
+    return noisy[numpy.argsort(noisy[:, 0], kind='stable')]
+
+def new_results():
+    return {name: {'correct': 0, 'times': [], 'rows': [], 'candidates': [], 'dropped': []} for name, _ in MATCHERS}
+
+def run_matchers(results, fingerprint, accepted_ids):
+    """Runs every matcher on one clip; a match counts as correct if its id is in `accepted_ids`."""
+    for name, search in MATCHERS:
+        start = time.perf_counter()
+        match = search(CLIP_DURATION_MS / 1000, fingerprint)
+        elapsed = time.perf_counter() - start
+
+        stats = results[name]
+        stats['times'].append(elapsed)
+        stats['rows'].append(DBModule.LastSearchStats.get('rows_read', 0))
+        stats['candidates'].append(DBModule.LastSearchStats.get('candidates', 0))
+        stats['dropped'].append(DBModule.LastSearchStats.get('bloom_dropped', 0))
+        if match and match['id'] in accepted_ids:
+            stats['correct'] += 1
+
+def print_results(results, total_clips):
+    print(f"Clips tested: {total_clips}")
+    for name, _ in MATCHERS:
+        stats = results[name]
+        times = sorted(stats['times'])
+        print(f"\n[{name}]")
+        print(f"  Accuracy:          {stats['correct']}/{total_clips} ({stats['correct']/total_clips*100:.1f}%)")
+        print(f"  Mean latency:      {sum(times)/len(times)*1000:.1f} ms")
+        print(f"  p95 latency:       {times[int(0.95 * (len(times) - 1))]*1000:.1f} ms")
+        print(f"  Mean rows read:    {sum(stats['rows'])/len(stats['rows']):.0f}")
+        print(f"  Mean songs scored: {sum(stats['candidates'])/len(stats['candidates']):.1f}")
+        print(f"  Mean hashes skipped by Bloom filter: {sum(stats['dropped'])/len(stats['dropped']):.0f}")
+
+def run_benchmark(songs_to_test):
+    """Runs every matcher on the same clips and compares accuracy, latency and rows read."""
+    results = new_results()
+    total_clips = 0
+
+    for i, song in enumerate(songs_to_test):
+        song_path = song['filepath']
+        if not song_path or not os.path.exists(song_path):
+            print(f"⚠️  Skipping '{song['title']}': Filepath not found or invalid.")
+            continue
+
+        audio = AudioSegment.from_mp3(song_path)
+        if len(audio) < CLIP_DURATION_MS:
+            print(f"ℹ️  Skipping '{song['title']}': Too short to test.")
+            continue
+
+        print(f"({i+1}/{len(songs_to_test)}) {song['title']} by {song['artist']}")
+        for _ in range(CLIPS_PER_SONG):
+            fingerprint = make_clip_fingerprint(audio)
+            if fingerprint.size == 0:
+                continue
+            total_clips += 1
+            run_matchers(results, fingerprint, {song['id']})
+
+    if os.path.exists(TEMP_RECORDING_PATH):
+        os.remove(TEMP_RECORDING_PATH)
+
+    print("\n" + "=" * 50)
+    print("🎉 MATCHER BENCHMARK COMPLETE 🎉")
+    print("-" * 50)
+    if not total_clips:
+        print("No clips were tested.")
+        return
+
+    print_results(results, total_clips)
+
+def run_duplicate_benchmark(songs_to_test):
+    """
+    Stores every tested song a second time in a scratch copy of the DB (from
+    its stored peaks) and matches noisy clips against it. Either copy counts
+    as correct. Every hash of these songs then has at least two postings,
+    which a shortlist built from only the rarest hashes would miss.
+    """
+    unsharded_path = DBModule.DB_PATH
+    duplicate_path = os.path.join(os.path.dirname(unsharded_path), DUPLICATE_DB_PATH)
+    shutil.copyfile(unsharded_path, duplicate_path)
+    DBModule.DB_PATH = duplicate_path
+
+    results = new_results()
+    total_clips = 0
+    try:
+        print(f"\n📀 Storing {len(songs_to_test)} songs twice, clips with {NOISE_PEAK_FRACTION:.0%} extra noise peaks")
+        print("-" * 50)
+        copies = {}
+        with sqlite3.connect(duplicate_path) as conn:
+            peaks = dict(conn.execute("SELECT song_id, data FROM peaks").fetchall())
+        for song in songs_to_test:
+            if song['id'] not in peaks:
+                continue
+            metadata = DBModule.GetSongById(song['id'])
+            duplicate_id = DBModule.AddSong(metadata)
+            DBModule.AddFingerprints(duplicate_id, DBModule.GenerateHashes(DBModule.DecodePeaks(peaks[song['id']])))
+            copies[song['id']] = duplicate_id
+
+        for i, song in enumerate(songs_to_test):
+            song_path = song['filepath']
+            if song['id'] not in copies or not song_path or not os.path.exists(song_path):
+                print(f"⚠️  Skipping '{song['title']}': no stored peaks or file not found.")
+                continue
+            audio = AudioSegment.from_mp3(song_path)
+            if len(audio) < CLIP_DURATION_MS:
+                print(f"ℹ️  Skipping '{song['title']}': Too short to test.")
+                continue
+
+            print(f"({i+1}/{len(songs_to_test)}) {song['title']} by {song['artist']}")
+            for _ in range(CLIPS_PER_SONG):
+                fingerprint = make_clip_fingerprint(audio)
+                if fingerprint.size == 0:
+                    continue
+                total_clips += 1
+                run_matchers(results, add_noise_peaks(fingerprint, NOISE_PEAK_FRACTION),
+                             {song['id'], copies[song['id']]})
+    finally:
+        DBModule.DB_PATH = unsharded_path
+        base = os.path.splitext(duplicate_path)[0]
+        for path in (duplicate_path, f"{base}.lock", f"{base}.bloom", TEMP_RECORDING_PATH):
+            if os.path.exists(path):
+                os.remove(path)
+
+    print("\n" + "=" * 50)
+    print("🎉 DUPLICATE-RECORDING BENCHMARK COMPLETE 🎉")
+    print("-" * 50)
+    if not total_clips:
+        print("No clips were tested.")
+        return
+
+    print_results(results, total_clips)
+
+if __name__ == "__main__":
+    if not os.path.exists(DBModule.DB_PATH):
+        print(f"❌ Database file not found at '{DBModule.DB_PATH}'.")
+        print("Please run 'AddSongs.py' first to create and populate the database.")
+    else:
+        DBModule.InitializeDatabase()
+        all_songs = get_all_songs_from_db()
+        if not all_songs:
+            print("❌ Database is empty. Please add songs using 'AddSongs.py' first.")
+        else:
+            num_to_test = min(int(sys.argv[1]), len(all_songs)) if len(sys.argv) > 1 else len(all_songs)
+            songs_to_test = random.sample(all_songs, num_to_test)
+            run_benchmark(songs_to_test)
+            if DBModule.GetShardCount():
+                print("\nℹ️  Skipping the duplicate-recording case: it needs an unsharded database.")
+            else:
+                run_duplicate_benchmark(songs_to_test)
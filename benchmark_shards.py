@@ -0,0 +1,129 @@
+import os
+import sys
+import random
+import shutil
+import time
+from pydub import AudioSegment
+import DBModule
+import ShardModule
+from benchmark_matcher import get_all_songs_from_db, make_clip_fingerprint, CLIP_DURATION_MS, CLIPS_PER_SONG, TEMP_RECORDING_PATH
+
+SHARDED_DB_PATH = "benchmark_sharded.db"
+
+def run_benchmark(songs_to_test, shard_count):
+    """
+    Shards a copy of the database, then runs every clip through each matcher
+    (two-stage and single-pass) on the unsharded DB and on the shards,
+    checking that the results agree and comparing accuracy and rows read.
+    """
+    unsharded_path = DBModule.DB_PATH
+    sharded_path = os.path.join(os.path.dirname(unsharded_path), SHARDED_DB_PATH)
+
+    print(f"📦 Copying database and splitting it into {shard_count} shards...")
+    shutil.copyfile(unsharded_path, sharded_path)
+    DBModule.DB_PATH = sharded_path
+    DBModule.ShardDatabase(shard_count)
+    searcher = ShardModule.ShardSearcher(shard_count)
+    DBModule.DB_PATH = unsharded_path
+
+    matchers = [
+        ("two-stage", DBModule.SearchDatabase, searcher.Search),
+        ("single-pass", DBModule.SearchDatabaseSinglePass, searcher.SearchSinglePass),
+    ]
+    results = {name: {'unsharded': [], 'sharded': [], 'rows_unsharded': [], 'rows_sharded': [],
+                      'correct_unsharded': 0, 'correct_sharded': 0, 'mismatches': 0}
+               for name, _, _ in matchers}
+    shard_times = [[] for _ in range(shard_count)]
+    total_clips = 0
+
+    try:
+        for i, song in enumerate(songs_to_test):
+            song_path = song['filepath']
+            if not song_path or not os.path.exists(song_path):
+                print(f"⚠️  Skipping '{song['title']}': Filepath not found or invalid.")
+                continue
+            audio = AudioSegment.from_mp3(song_path)
+            if len(audio) < CLIP_DURATION_MS:
+                print(f"ℹ️  Skipping '{song['title']}': Too short to test.")
+                continue
+
+            print(f"({i+1}/{len(songs_to_test)}) {song['title']} by {song['artist']}")
+            for _ in range(CLIPS_PER_SONG):
+                fingerprint = make_clip_fingerprint(audio)
+                if fingerprint.size == 0:
+                    continue
+                total_clips += 1
+
+                for name, unsharded_search, sharded_search in matchers:
+                    stats = results[name]
+
+                    start = time.perf_counter()
+                    expected = unsharded_search(CLIP_DURATION_MS / 1000, fingerprint)
+                    stats['unsharded'].append(time.perf_counter() - start)
+                    stats['rows_unsharded'].append(DBModule.LastSearchStats.get('rows_read', 0))
+
+                    start = time.perf_counter()
+                    result = sharded_search(fingerprint)
+                    stats['sharded'].append(time.perf_counter() - start)
+                    stats['rows_sharded'].append(DBModule.LastSearchStats.get('rows_read', 0))
+                    if name == "two-stage":
+                        for index, elapsed in enumerate(DBModule.LastSearchStats.get('shard_times', [])):
+                            shard_times[index].append(elapsed)
+
+                    expected_id = expected['id'] if expected else 0
+                    result_id = result['id'] if result else 0
+                    stats['correct_unsharded'] += expected_id == song['id']
+                    stats['correct_sharded'] += result_id == song['id']
+                    if expected_id != result_id:
+                        stats['mismatches'] += 1
+                        print(f"  ❌ {name} mismatch: unsharded={expected_id} sharded={result_id}")
+    finally:
+        searcher.Close()
+        DBModule.DB_PATH = sharded_path
+        # ShardDatabase also leaves the copy's Bloom filter and writer lock file.
+        scratch_files = [DBModule.ShardPath(index) for index in range(shard_count)]
+        scratch_files += [sharded_path, DBModule.BloomPath(), f"{os.path.splitext(sharded_path)[0]}.lock"]
+        DBModule.DB_PATH = unsharded_path
+        for path in scratch_files + [TEMP_RECORDING_PATH]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    print("\n" + "=" * 50)
+    print("🎉 SHARD BENCHMARK COMPLETE 🎉")
+    print("-" * 50)
+    if not total_clips:
+        print("No clips were tested.")
+        return
+
+    print(f"Clips tested: {total_clips}")
+    for name, _, _ in matchers:
+        stats = results[name]
+        print(f"\n[{name}]")
+        print(f"  Results matching unsharded DB: {total_clips - stats['mismatches']}/{total_clips}")
+        print(f"  Accuracy:        unsharded {stats['correct_unsharded']}/{total_clips}, "
+              f"sharded {stats['correct_sharded']}/{total_clips}")
+        print(f"  Mean latency:    unsharded {sum(stats['unsharded'])/total_clips*1000:.1f} ms, "
+              f"sharded {sum(stats['sharded'])/total_clips*1000:.1f} ms")
+        print(f"  Mean rows read:  unsharded {sum(stats['rows_unsharded'])/total_clips:.0f}, "
+              f"sharded {sum(stats['rows_sharded'])/total_clips:.0f}")
+
+    print("\nPer-shard time (two-stage):")
+    for index, times in enumerate(shard_times):
+        if times:
+            print(f"  Shard {index}: mean {sum(times)/len(times)*1000:.1f} ms, max {max(times)*1000:.1f} ms")
+
+if __name__ == "__main__":
+    if not os.path.exists(DBModule.DB_PATH):
+        print(f"❌ Database file not found at '{DBModule.DB_PATH}'.")
+        print("Please run 'AddSongs.py' first to create and populate the database.")
+    elif DBModule.GetShardCount():
+        print("❌ The database is already sharded. Run 'python ShardSongs.py 0' first.")
+    else:
+        DBModule.InitializeDatabase()
+        all_songs = get_all_songs_from_db()
+        if not all_songs:
+            print("❌ Database is empty. Please add songs using 'AddSongs.py' first.")
+        else:
+            shard_count = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+            num_to_test = min(int(sys.argv[2]), len(all_songs)) if len(sys.argv) > 2 else len(all_songs)
+            run_benchmark(random.sample(all_songs, num_to_test), shard_count)
@@ -0,0 +1,168 @@
+import os
+import sys
+import random
+import threading
+import time
+from pydub import AudioSegment
+
+# psutil lets each session count the CPU used by the shard worker processes;
+# without it only the harness process is measured per session.
+try:
+    import psutil
+except ImportError:
+    psutil = None
+import AudioModule
+import DBModule
+import ShardModule
+from benchmark_matcher import get_all_songs_from_db
+
+# --- REPLAY CONFIGURATION (mirrors MainApplication.recordButtonClick) ---
+RECORD_DURATION = 15      # seconds of audio captured per session
+SAVE_FREQUENCY = 1        # seconds between writes to the recording file
+INITIAL_WAIT = 2          # seconds before the first recognition attempt
+SESSIONS_PER_SONG = 3
+TEMP_SONG_PATH = "temp_replay_song.wav"
+TEMP_RECORDING_PATH = "temp_replay_recording.wav"
+
+def cpu_seconds():
+    """
+    User + system CPU seconds used so far by this process and, when psutil is
+    available, by its live child processes (the shard search workers).
+    """
+    if psutil is None:
+        return time.process_time()
+    process = psutil.Process()
+    total = sum(process.cpu_times()[:2])
+    for child in process.children(recursive=True):
+        try:
+            total += sum(child.cpu_times()[:2])
+        except psutil.NoSuchProcess:
+            pass
+    return total
+
+def run_session(wav_path, start, speed):
+    """
+    Runs one capture-to-recognition session exactly as the GUI does, but with
+    a FileSource in place of the microphone. Waits are divided by `speed`
+    so the loop sees the same amount of audio per poll at any replay rate.
+
+    'audio' is how much of the clip had been captured when the match came
+    back, 'wall' the wall-clock latency. Fingerprinting and search time is
+    real time at any speed, so only 'audio' is comparable across speeds.
+    """
+    source = AudioModule.FileSource(wav_path, speed=speed, start=start, duration=RECORD_DURATION)
+
+    cpu_start = cpu_seconds()
+    wall_start = time.perf_counter()
+    recordThread = threading.Thread(target=AudioModule.RecordAudio,
+                                    args=(RECORD_DURATION, TEMP_RECORDING_PATH, SAVE_FREQUENCY, source))
+    recordThread.start()
+    time.sleep(INITIAL_WAIT / speed)
+
+    songMetaData = AudioModule.IdentifyWhileRecording(
+        recordThread, TEMP_RECORDING_PATH,
+        lambda: source.position / source.samplerate,
+        pollInterval=1.0 / speed
+    )
+    wall = time.perf_counter() - wall_start
+    audio = source.position / source.samplerate
+    cpu = cpu_seconds() - cpu_start
+
+    AudioModule.stopCondition = True
+    recordThread.join()
+
+    return {
+        'match_id': songMetaData['id'] if songMetaData else 0,
+        'wall': wall,
+        'audio': audio,
+        'cpu': cpu,
+    }
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[int(fraction * (len(values) - 1))]
+
+def run_harness(songs_to_test, speed):
+    print(f"Replaying {len(songs_to_test)} songs at {speed}x real time, {SESSIONS_PER_SONG} sessions each")
+    print("-" * 50)
+
+    sessions = []
+    for i, song in enumerate(songs_to_test):
+        song_path = song['filepath']
+        if not song_path or not os.path.exists(song_path):
+            print(f"⚠️  Skipping '{song['title']}': Filepath not found or invalid.")
+            continue
+
+        audio = AudioSegment.from_mp3(song_path).set_channels(1).set_frame_rate(44100)
+        if len(audio) < RECORD_DURATION * 1000:
+            print(f"ℹ️  Skipping '{song['title']}': Too short to test.")
+            continue
+        audio.export(TEMP_SONG_PATH, format="wav")
+
+        print(f"({i+1}/{len(songs_to_test)}) {song['title']} by {song['artist']}")
+        for _ in range(SESSIONS_PER_SONG):
+            start = random.uniform(0, len(audio) / 1000 - RECORD_DURATION)
+            session = run_session(TEMP_SONG_PATH, start, speed)
+            session['correct'] = session['match_id'] == song['id']
+            sessions.append(session)
+
+            outcome = "✅" if session['correct'] else ("❌ wrong song" if session['match_id'] else "❌ no match")
+            print(f"  {outcome}  {session['wall']:.2f}s wall / {session['audio']:.2f}s audio, "
+                  f"CPU {session['cpu']:.2f}s ({session['cpu'] / session['wall'] * 100:.0f}%)")
+
+    # Stop the shard workers so their CPU time is reaped into os.times().
+    if ShardModule._searcher is not None:
+        ShardModule._searcher.Close()
+        ShardModule._searcher = None
+    children = os.times()
+    worker_cpu = children.children_user + children.children_system
+
+    for path in (TEMP_SONG_PATH, TEMP_RECORDING_PATH):
+        if os.path.exists(path):
+            os.remove(path)
+
+    print("\n" + "=" * 50)
+    print("🎉 REPLAY HARNESS COMPLETE 🎉")
+    print("-" * 50)
+    if not sessions:
+        print("No sessions were run.")
+        return
+
+    matched = [s for s in sessions if s['correct']]
+    print(f"Sessions: {len(sessions)}  correct: {len(matched)}  "
+          f"wrong: {len([s for s in sessions if s['match_id'] and not s['correct']])}  "
+          f"no match: {len([s for s in sessions if not s['match_id']])}")
+    if matched:
+        audio_times = [s['audio'] for s in matched]
+        wall_times = [s['wall'] for s in matched]
+        print("Time to correct match (audio captured / wall-clock latency):")
+        for label, fraction in (("min", 0.0), ("p50", 0.5), ("p90", 0.9), ("max", 1.0)):
+            print(f"  {label}: {percentile(audio_times, fraction):.2f}s audio / {percentile(wall_times, fraction):.2f}s wall")
+    cpu_times = [s['cpu'] for s in sessions]
+    utilisation = [s['cpu'] / s['wall'] for s in sessions]
+    print(f"CPU per session: mean {sum(cpu_times) / len(cpu_times):.2f}s, max {max(cpu_times):.2f}s")
+    print(f"CPU utilisation: mean {sum(utilisation) / len(utilisation) * 100:.0f}% of one core")
+    if psutil is None:
+        print("ℹ️  psutil not installed: per-session CPU covers the harness process only.")
+        if worker_cpu:
+            print(f"Shard worker CPU (all sessions): {worker_cpu:.2f}s total, "
+                  f"{worker_cpu / len(sessions):.2f}s per session")
+    else:
+        print("CPU figures include the shard worker processes.")
+
+if __name__ == "__main__":
+    if not os.path.exists(DBModule.DB_PATH):
+        print(f"❌ Database file not found at '{DBModule.DB_PATH}'.")
+        print("Please run 'AddSongs.py' first to create and populate the database.")
+    else:
+        DBModule.InitializeDatabase()
+        all_songs = get_all_songs_from_db()
+        if not all_songs:
+            print("❌ Database is empty. Please add songs using 'AddSongs.py' first.")
+        else:
+            speed = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+            if speed <= 0:
+                print("❌ Speed must be greater than 0 (the capture loop stops when recording ends).")
+                sys.exit(1)
+            num_to_test = min(int(sys.argv[2]), len(all_songs)) if len(sys.argv) > 2 else len(all_songs)
+            run_harness(random.sample(all_songs, num_to_test), speed)